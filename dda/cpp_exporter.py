@@ -162,6 +162,7 @@ void compute_aux(%(state_type)s const& %(state_name)s, %(aux_type)s &%(aux_name)
 // not used:
 // bool
 //    shall_differentiate{ %(differentiate_data)s };
+constexpr bool any_differentiation = %(any_differentiation)s;
     
 %(state_type)s integrate(%(state_type)s& %(state_name)s, %(aux_type)s& %(aux_name)s, int rk_order) {
     %(state_type)s k1, k2, k3, k4;
@@ -259,12 +260,17 @@ struct csv_writer {
     for(int iter = 0; iter < max_iterations; iter++) {
         %(state_type)s integrated = integrate(%(state_name)s, %(aux_name)s, rk_order);
         
-        %(aux_type)s dummy; %(state_type)s dqdt;
-        f(%(state_name)s, dqdt, dummy); // etxra round for dqdt only neccessary for first timestep
-        %(state_type)s differences = (dqdt + old*(-1.0)) / dt;
-        
-        old = dqdt;
-        %(state_name)s = %(state_type)s::diff_or_integrate(integrated, differences);
+        if(any_differentiation) {
+            %(aux_type)s dummy; %(state_type)s dqdt;
+            f(%(state_name)s, dqdt, dummy); // etxra round for dqdt only neccessary for first timestep
+            %(state_type)s differences = (dqdt + old*(-1.0)) / dt;
+            
+            old = dqdt;
+            %(state_name)s = %(state_type)s::diff_or_integrate(integrated, differences);
+        } else {
+            // no diff(...) at all: spare the extra evaluation of f for the differences
+            %(state_name)s = integrated;
+        }
             
         // TODO: Currently, differentiation is always first order forward
         //       in time. Could also do higher order.
@@ -603,6 +609,7 @@ def to_cpp(state, number_precision=math.inf, constexpr_consts=True):
     
     # leftover/bookkeeping/better doing    
     differentiate_data = J(str(differentiate[var]) for var in vars.evolved)
+    any_differentiation = "true" if any(differentiate.values()) else "false"
 
     #state_assignments = lambda lst: C(f"{v} = {state[v]};" for v in lst)) if lst else C("/* none */")
     state_assignments = lambda lhs_struct,lst: [f"{lhs_struct}.{var} = {state[var]};" for var in lst] if lst else ["/* none */"]
@@ -674,18 +681,39 @@ def to_cpp(state, number_precision=math.inf, constexpr_consts=True):
 default_c_filename = "generated.cc"
 default_compiler_output = "./a.out"
 
+# Remembers what was compiled to which binary: compiler_output -> (checksum, mtime of binary)
+_compiled = {}
+
+def _run_compiler(command):
+    "Runs the compiler command line, returns its exit status (nonzero on failure)"
+    return os.system(command)
+
 def compile(code, c_filename=default_c_filename, compiler="g++", compiler_output=default_compiler_output, options="--std=c++17 -Wall"):
     """
     Small helper function to compile C++ code from python.
     
     Write string *code* to *c_filename* and run the *compiler* on that, afterwards.
     Will raise an error if compilation fails.
+    
+    Compiling is skipped if the very same code was already compiled to *compiler_output*
+    with the same command by this python process and the binary was not touched since then.
+    This saves the compiler run when the same code is compiled repeatedly, for instance
+    when running a simulation several times with different runtime arguments.
     """
-    from os import system
+    import hashlib # builtin
+    command = f"{compiler} -o{compiler_output} {options} {c_filename}"
+    # the command also holds c_filename, so it is part of the checksum
+    checksum = hashlib.blake2b((os.getcwd() + "\0" + command + "\0" + code).encode(), digest_size=16).hexdigest()
+    binary = os.path.abspath(compiler_output) # robust against changing the working directory
+    if binary in _compiled and os.path.exists(binary) and os.path.exists(c_filename) \
+       and _compiled[binary] == (checksum, os.path.getmtime(binary)):
+        return
     with open(c_filename, "w") as fh:
         print(code, file=fh)
-    if system(f"{compiler} -o{compiler_output} {options} {c_filename}"):
+    if _run_compiler(command):
+        _compiled.pop(binary, None)
         raise ValueError("Could not compile C source!")
+    _compiled[binary] = (checksum, os.path.getmtime(binary))
 
 def runproc(command, decode=False):
     "Helper to run external command and slurp its output to a binary array"
@@ -840,8 +868,13 @@ class Solver:
         
         compile(self.c_code, c_filename=self.code_name, compiler_output=self.output_name)
         
-    def run(self, *runtime_fields_to_export, binary=False, cleanup=True, **runtime_arguments):
-        "Chaining and Syntactic sugar for delayed argument setting/overwriting"
+    def run(self, *runtime_fields_to_export, binary=True, cleanup=True, **runtime_arguments):
+        """
+        Chaining and Syntactic sugar for delayed argument setting/overwriting.
+        
+        Since the Solver knows the fields it reads, the data are exchanged in binary by default,
+        which spares writing and parsing CSV. Pass ``binary=False`` for the text output.
+        """
         self.runtime_arguments = { **runtime_arguments, **self.default_runtime_arguments }
         self.runtime_fields_to_export = list(runtime_fields_to_export if runtime_fields_to_export else self.default_runtime_fields_to_export)
         self.binary = binary
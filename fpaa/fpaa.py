@@ -29,31 +29,28 @@
 # Python-included
 import sys, os, argparse, glob, logging
 from math import ceil
-from copy import deepcopy
-from collections import OrderedDict, namedtuple, defaultdict
+from collections import namedtuple, defaultdict
 from pprint import pprint, pformat
 from collections.abc import Iterable
 from pathlib import Path
-from functools import reduce
+from itertools import chain
 from numbers import Number
 
 # Helper routines for simply nested dictionaries:
-flatten_dict = lambda dct: dict(reduce(lambda a,b: a+b, [list(dict(k).items()) for k in dct.values()]))
+flatten_dict = lambda dct: dict(chain.from_iterable(d.items() for d in dct.values()))
 filter_dict = lambda dct: { k:v for k,v in dct.items() if v }
+# Copy of nested dicts and lists as read from YAML, much cheaper than copy.deepcopy
+copy_nested = lambda data: { k: copy_nested(v) for k,v in data.items() } if isinstance(data, dict) else \
+    [ copy_nested(v) for v in data ] if isinstance(data, list) else data
 # Map [{'I1':'a'},{'I2':'b'},...] -> [('I1','a'),('I2','b'),...]
 Target = namedtuple("Target", ['part','pin'])
 pin2tuple = lambda dct: [ Target(t,p) for (t,p) in dct.items() ][0]
-pins2tuples = lambda pl: [ Target(t,p) for tp in pl for (t,p) in tp.items() ]
 # no need for bitarray
 bool2bin = lambda boolean: '1' if boolean else '0'
 int2bin = lambda number: bin(number)[2:] # cutting away the 0b from 0b10101
 boolList2BinString = lambda lst: ''.join(map(bool2bin, lst))
 bitstring2bin = lambda s: int('0b'+s, base=2)
 
-def chunks(lst, n):
-    for i in range(0, len(lst),n):
-        yield lst[i:i+n]
-
 module = __file__
 log = logging.getLogger(module)
 
@@ -66,9 +63,12 @@ def yaml_load(fname):
     # external dependencies, install with "pip install pyyaml"
     # If you don't have pip, install pip with "easy_install pip"
     import yaml # PyYAML
+    # The libyaml based loader is much faster but only available if PyYAML was built with libyaml
+    Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     
-    with open(fname, "r") as cfh:
-        return yaml.load(cfh, Loader=yaml.SafeLoader) # may rise ScannerError
+    # Binary mode lets the YAML parser detect the encoding (UTF-8 by default) instead of the locale
+    with open(fname, "rb") as cfh:
+        return yaml.load(cfh, Loader=Loader) # may rise ScannerError
 
 
 architectures_basedir = os.path.dirname(os.path.realpath(__file__))
@@ -87,6 +87,10 @@ def load_from_yaml(circuit, arch):
     circuit = yaml_load(circuit)
     return (circuit, arch)
 
+def default_outputs(arch):
+    "First output line of each entity in arch, which is the default signal of a part"
+    return { entity: edesc['output'][0]['name'] for entity, edesc in arch['entities'].items() if edesc.get('output') }
+
 def synthesize(circuit, arch):
     """
     Translate a circuit to a netlist for a given target architecture.
@@ -115,17 +119,20 @@ def synthesize(circuit, arch):
     info("Input program: "  + circuit['title'])
     info("Target machine: " + arch['title'])
 
-    debug("arch:")
-    debug(pformat(arch))
-    debug("-----------------------------------------------------")
-    debug("circuit:")
-    debug(pformat(circuit))
-    debug("-----------------------------------------------------")
+    if log.isEnabledFor(logging.DEBUG): # pretty printing is expensive, even if the output is dropped
+        debug("arch:")
+        debug(pformat(arch))
+        debug("-----------------------------------------------------")
+        debug("circuit:")
+        debug(pformat(circuit))
+        debug("-----------------------------------------------------")
 
     assigned_parts_by_entity = filter_dict({
-        entity: OrderedDict({ part: None for part,parch in arch['configurable_parts'].items()
-            if parch['type']==entity and not 'cannot_be_allocated' in parch })
+        entity: { part: None for part,parch in arch['configurable_parts'].items()
+            if parch['type']==entity and not 'cannot_be_allocated' in parch }
         for entity in arch['entities'].keys() })
+    # Parts are allocated in order and never freed, so an iterator per entity yields the next free part
+    free_parts = { entity: iter(parts) for entity, parts in assigned_parts_by_entity.items() }
 
     # Determine mapping of part names (circuit -> arch)
     for part, spec in circuit['program'].items():
@@ -133,12 +140,10 @@ def synthesize(circuit, arch):
         if not t in arch['entities']:
             raise ValueError(f"Invalid type {t} for Part {part} in Netlist {circuit['title']}. Available types for given architecture {arch['title']} are: {', '.join(arch['entities'].keys())}")
         assigned_parts = assigned_parts_by_entity[t]
-        none_allocated_parts = [k for k,v in assigned_parts.items() if not v ]
-        #import ipdb; ipdb.set_trace() 
-        if len(none_allocated_parts) == 0:
+        target = next(free_parts[t], None)
+        if target is None:
             raise ValueError(f"Have used up all {len(assigned_parts)} parts of type {t} in architecture {arch['title']}! Cannot allocate another one.")
-        target = none_allocated_parts[0]
-        info(f"Allocating Type {t}: Mapping circuit part {part} onto architecture part {target}")
+        info("Allocating Type %s: Mapping circuit part %s onto architecture part %s", t, part, target)
         assigned_parts[target] = part
 
     # Mapping from architectured parts to user-named parts (having also None's for unallocated parts)
@@ -150,13 +155,18 @@ def synthesize(circuit, arch):
     user2arch = { v:k for k,v in arch2user.items() }
     # Note that arch2user is not always invertible. Several arch parts could
     # not be used and resolve to None.
+    # Describes a part in error messages:
+    userdesc = lambda pname: f"Architecture part {pname} (User part {arch2user[pname]})"
 
     # Setup the wired circuit. In this dictionary, the parts are named as in
     # the architecture and *not* as from the user view. Use arch2user to translate
     # the user view, i.e. access like wired_circuit[arch2user[userpartname]]...
-    wired_circuit = deepcopy(arch['configurable_parts'])
-    for part in filter_dict(assigned_parts).keys():
-        wired_circuit[part].update(circuit['program'][assigned_parts[part]])
+    wired_circuit = copy_nested(arch['configurable_parts'])
+    for part, user_part in assigned_parts.items():
+        if user_part:
+            wired_circuit[part].update(circuit['program'][user_part])
+
+    default_output = default_outputs(arch)
 
     def resolve_user_pin(item): # closure over arch
         """
@@ -167,9 +177,10 @@ def synthesize(circuit, arch):
         """
         if isinstance(item, str):
             item = user2arch[item]
-            return {item: arch['entities'][wired_circuit[item]['type']]['output'][0]['name'] }
+            return {item: default_output[wired_circuit[item]['type']] }
         elif (isinstance(item, dict) and len(item)==1):
-            return { user2arch[k]: v for k,v in item.items() } # could also convert to Target() at this place
+            (k,v), = item.items()
+            return { user2arch[k]: v } # could also convert to Target() at this place
         elif isinstance(item, Number):
             return item
         else: raise ValueError(f"Malformed target notation: {item}")
@@ -202,7 +213,7 @@ def synthesize(circuit, arch):
             for name, target in part['input'].items():
                 if isinstance(target, str) and target in circuit['coefficients'].keys():
                     part['input'][name] = circuit['coefficients'][target]
-                    info(f"Resolving variable {target}={part['input'][name]} at architecture part {pname}/{name}")
+                    info("Resolving variable %s=%s at architecture part %s/%s", target, part['input'][name], pname, name)
 
 
         # Name implicit (first) output lines
@@ -211,48 +222,49 @@ def synthesize(circuit, arch):
                 part['input'][name] = resolve_user_pin(target)
             except KeyError: # thrown by user2arch
                 #debug(f"Will pass malformed user target '{target}' at users {pname} to next sweep")
-                userdesc = f"Architecture part {pname} (User part {arch2user[pname]})"
-                raise ValueError(f"{userdesc}, input {name}: Cannot understand {target}, certainly because it is nonexistent")
+                raise ValueError(f"{userdesc(pname)}, input {name}: Cannot understand {target}, certainly because it is nonexistent")
             #if isinstance(target, str):
             #    part['input'][name] = {target: arch['entities'][wired_circuit[target]['type']]['output'][0]['name'] }
 
 
+    # Lookup of input and output line descriptions by name, per entity type
+    inputs_by_name = { entity: { dct['name']: dct for dct in edesc.get('input', []) } for entity, edesc in arch['entities'].items() }
+    outputs_by_name = { entity: { dct['name']: dct for dct in edesc.get('output', []) } for entity, edesc in arch['entities'].items() }
+
     # final sweep over all configurable parts:
     for pname, part in wired_circuit.items():
-        userdesc = f"Architecture part {pname} (User part {arch2user[pname]})"
+        input_descs = inputs_by_name[part['type']]
         # Check wire types
         for name, target in part['input'].items():
-            adesc = { dct['name']: dct for dct in arch['entities'][part['type']]['input'] }
-            if not name in adesc:
-                raise ValueError(f"{userdesc} constructs input line {name} which doesn't exist for type {part['type']}")
-            adesc = adesc[name]
+            if not name in input_descs:
+                raise ValueError(f"{userdesc(pname)} constructs input line {name} which doesn't exist for type {part['type']}")
+            adesc = input_descs[name]
             if adesc['type'] == 'numeric' and not isinstance(target, Number):
-                raise ValueError(f"{userdesc} requires a number, but {target} given. (Hint: Maybe you used an undefined variable)")
+                raise ValueError(f"{userdesc(pname)} requires a number, but {target} given. (Hint: Maybe you used an undefined variable)")
             if isinstance(target, dict):
                 if len(target) > 1:
-                    raise ValueError(f"{userdesc} contains too many information. {target} given")
+                    raise ValueError(f"{userdesc(pname)} contains too many information. {target} given")
                 (tpart,tline), = target.items()
-                tpart_reference = {dct['name']:dct for dct in arch['entities'][wired_circuit[tpart]['type']]['output'] }
+                tpart_reference = outputs_by_name[wired_circuit[tpart]['type']]
                 if not tline in tpart_reference:
                     usertarget = { arch2user[k]:v for k,v in target.items() }
-                    raise ValueError(f"{userdesc} wires to nonexisting target in input {target} (User provided {usertarget})")
+                    raise ValueError(f"{userdesc(pname)} wires to nonexisting target in input {target} (User provided {usertarget})")
                 tpart_reference = tpart_reference[tline]
                 if tpart_reference['type'] != adesc['type']:
-                    raise ValueError(f"I{userdesc}: Incompatible target line {name}. Required type: {tpart_reference['type']}, but lined to {adesc}")
+                    raise ValueError(f"I{userdesc(pname)}: Incompatible target line {name}. Required type: {tpart_reference['type']}, but lined to {adesc}")
 
                 # Give output information, because we can.
                 wired_circuit[tpart]['output'][tline].append({pname:name})
 
         # Check if everything is given
-        missing_keys = set([i['name'] for i in arch['entities'][part['type']]['input']]) \
-                    - set(part['input'].keys())
+        missing_keys = input_descs.keys() - part['input'].keys()
         if missing_keys:
-            raise ValueError(f"{userdesc}: Too few input lines given: Missing keys {missing_keys}")
+            raise ValueError(f"{userdesc(pname)}: Too few input lines given: Missing keys {missing_keys}")
 
     # really final sweep: Ensure nonused parts have no output
     for pname, part in wired_circuit.items():
         if len(part['input']) == 0 and len(part['output']) > 0 and not 'cannot_be_allocated' in part:
-            raise ValueError(f"{userdesc} has no input but is wired to {part['output']}. The universe will collapse into a black hole!")
+            raise ValueError(f"{userdesc(pname)} has no input but is wired to {part['output']}. The universe will collapse into a black hole!")
 
     # As a service, for the time being, provide the readout/measurement positions as info
     if "observables" in circuit:
@@ -275,9 +287,9 @@ def normalize_potentiometer(value, resolution_bits=10):
     "Map a real value [0..1] to Potentiometer value [0..1023]"
     maxval = 2**resolution_bits - 1 # 2**10-1 = 1023
     value = float(value)
-    if value < 0 or value > 1:
+    if not 0 <= value <= 1: # also rejects NaN
         raise ValueError(f"Digital potentiometer value {value} out of bounds")
-    return int(round(value * maxval))
+    return round(value * maxval) # round() of a float already is an int
 
 last_seen_xbars = [] # an ugly global, filled by compile_instructions; for later plotting
 
@@ -307,44 +319,52 @@ def compile_instructions(wired_circuit, arch):
     # should actually call write(tpl) or directly PyHyCon
     instruct = lambda *tpl: instructions.append(tpl)
 
+    default_output = default_outputs(arch)
+
     def resolve_machine_pin(item): # closure over arch
         """
         Expects an architecture part name. Never comes in touch with user names.
-        Expands something like 'M2' to {'M2':'o'}, i.e. part -> {part:signal},
+        Expands something like 'M2' or {'M2':'o'} to Target('M2','o'), i.e. part -> (part,signal),
         where the default signal is the first output signal.
         (Note: This is a closoure over wired_circuit in a pseudo-OOP fashion.)
         """
         if isinstance(item, str):
-            return {item: arch['entities'][wired_circuit[item]['type']]['output'][0]['name'] }
-        elif (isinstance(item, dict) and len(item)==1) or isinstance(item, Number):
-            return item
+            return Target(item, default_output[wired_circuit[item]['type']])
+        elif isinstance(item, dict) and len(item)==1:
+            (part, pin), = item.items()
+            return Target(part, pin)
         else: raise ValueError(f"Malformed target notation: {item}")
 
+    # Wired inputs of all parts as Targets, shared by all XBARs
+    inputs = { pname: { line: pin2tuple(target) for line,target in part['input'].items()
+            if isinstance(target,dict) } #and not "None" in target } # filter out empty inputs
+            for pname,part in wired_circuit.items() }
+
     # Go over hardwired parts
     for hwname, hw in arch['wired_parts'].items():
         if hw['type'] == "DPT24":
             # DPT24 Potentiometers
             assert len(hw['enumeration']) <= 24, "DPT24 has only 24 digital potentiometers"
-            for port, t in enumerate(pins2tuples(map(resolve_machine_pin,hw['enumeration']))):
+            for port, t in enumerate(map(resolve_machine_pin, hw['enumeration'])):
                 numeric_value = wired_circuit[t.part]['input'][t.pin]
                 normalized_value = normalize_potentiometer(numeric_value)
-                info(f"DPT24@{hw['address']:x}: Storing value {'%4d'%normalized_value} at DPT port {port:2} (corresponding to {t.part}:{t.pin})")
+                info("DPT24@%x: Storing value %4d at DPT port %2d (corresponding to %s:%s)", hw['address'], normalized_value, port, t.part, t.pin)
                 #print(f'$ac->set_pt("DPT24-{port}", {numeric_value});')
                 instruct("P", hw['address'], "%02X"%port, "%04d"%normalized_value)
         elif hw['type'] == 'HC':
             # Hybrid controller: DPTs (same code as DPT24)
             assert len(hw['dpt_enumeration']) <= 8, "HC has only eight digital potentiometers"
-            for port, t in enumerate(pins2tuples(map(resolve_machine_pin,hw['dpt_enumeration']))):
+            for port, t in enumerate(map(resolve_machine_pin, hw['dpt_enumeration'])):
                 numeric_value = wired_circuit[t.part]['input'][t.pin]
                 normalized_value = normalize_potentiometer(numeric_value)
-                info(f"HC@{hw['address']:x}: Storing value {normalized_value:4} at DPT port {port:2} (corresponding to {t.part}:{t.pin})")
+                info("HC@%x: Storing value %4d at DPT port %2d (corresponding to %s:%s)", hw['address'], normalized_value, port, t.part, t.pin)
                 instruct("P", hw['address'], "%02X"%port, "%04d"%normalized_value)
                 #print(f'$ac->set_pt("HCDPT-{port}", {numeric_value});')
             # Hybrid controller: Digital output
             assert len(hw['digital_output']) <= 8, "HC has only eight digital outputs"
-            for port, t in enumerate(pins2tuples(map(resolve_machine_pin,hw['digital_output']))):
+            for port, t in enumerate(map(resolve_machine_pin, hw['digital_output'])):
                 value = wired_circuit[t.part]['input'][t.pin]
-                info(f"HC@{hw['address']:x}: Storing {value} at digital output port {port} (corresponding to {t.part}:{t.pin})")
+                info("HC@%x: Storing %s at digital output port %d (corresponding to %s:%s)", hw['address'], value, port, t.part, t.pin)
                 instruct("D" if value else "d", hw['address'], "%1d"%port)
                 #print(f'$ac->digital_output({port}, %d);' % (1 if value else 0))
         elif hw['type'] == 'XBAR':
@@ -352,41 +372,43 @@ def compile_instructions(wired_circuit, arch):
             N,M = len(hw['output_rows']), len(hw['input_columns'])
             assert N==16 and M==16, "XBAR only implemented for 16x16"
             info(f"XBAR@{hw['address']:x}: Computing XBAR of size NxM={N}x{M}")
-            cols = pins2tuples(map(resolve_machine_pin, hw['input_columns']))
-            rows = pins2tuples(map(resolve_machine_pin, hw['output_rows']))
+            cols = list(map(resolve_machine_pin, hw['input_columns']))
+            rows = list(map(resolve_machine_pin, hw['output_rows']))
             #outputs = { pname: dict(part['output']) for pname,part in wired_circuit.items() }
-            inputs = { pname: { line: pin2tuple(target) for line,target in part['input'].items()
-                    if isinstance(target,dict) } #and not "None" in target } # filter out empty inputs
-                    for pname,part in wired_circuit.items() }
 
             # The AD8113 enforces that there is only one connection per (output) row.
             # In other words: In the XBAR, an output line can be connected only to one input
             #   line, but an input line in the XBAR can connect up to 16 outputs.
             # This is realized by having an output row being encoded in only 4 bits instead of 16.
 
-            boolean_matrix = [[ ol in inputs[op] and Target(ip,il) == inputs[op][ol] and op!="None" and ip!="None" for (ip,il) in cols] for (op,ol) in rows]
-            row_bitstrings = list(map(boolList2BinString, boolean_matrix))
+            # Look up the source of each output row once instead of for every (row, column) pair
+            sources = [ inputs[op].get(ol) if op!="None" else None for (op,ol) in rows ]
+            boolean_matrix = [[ source == col and col.part!="None" for col in cols] for source in sources]
             row_numbers = [ row.index(True) if sum(row) else 0 for row in boolean_matrix ]
             row_active = [sum(row)==1 for row in boolean_matrix]
-            row_bitstring = [ f"{active:b}{num:04b}" for num,active in zip(row_numbers, row_active) ]
-                    
-            for i,(bitvec,num,active,bitvec2,(op,ol)) in enumerate(zip(row_bitstrings,row_numbers,row_active,row_bitstring,rows)):
-                info(f"XBAR@{hw['address']:x}: Writing bitmatrix[row {i:2}]:",
-                    f"{bitvec}={num:2d}=0x{num:1x} -> {op}:{ol}       [sending {bitvec2}]" if active else
-                    f"{bitvec} [output not enabled] [sending {bitvec2}]")
+
+            if log.isEnabledFor(logging.INFO): # the bit strings are only needed for the info output
+                row_bitstrings = list(map(boolList2BinString, boolean_matrix))
+                row_bitstring = [ f"{active:b}{num:04b}" for num,active in zip(row_numbers, row_active) ]
+                for i,(bitvec,num,active,bitvec2,(op,ol)) in enumerate(zip(row_bitstrings,row_numbers,row_active,row_bitstring,rows)):
+                    info(f"XBAR@{hw['address']:x}: Writing bitmatrix[row {i:2}]: " +
+                        (f"{bitvec}={num:2d}=0x{num:1x} -> {op}:{ol}       [sending {bitvec2}]" if active else
+                        f"{bitvec} [output not enabled] [sending {bitvec2}]"))
 
             if not all([sum(row) in (0,1) for row in boolean_matrix ]):
                 raise ValueError("XBAR matrix is unsuitable. See info output for it's values. Only a maximum of one `True` bit per row allowed.")
             
             last_seen_xbars.append( (cols,rows,boolean_matrix) ) # for later plotting...
 
-            # Caveat 1: Chip expects rows in order row15...row0
-            # Caveat 2: Don't try to convert a bitstring of length 80 to a single int, it will overflow.
-            bitstring = "".join(row_bitstring[::-1])
-            assert len(bitstring)==80, "XBAR bitstring has wrong length"
-            bitstring_hex = "".join(["%02X"%int(x, base=2) for x in chunks( "".join(row_bitstring[::-1]), 8)])
-            info(f"Bitstream to send ({len(bitstring)} characters): {bitstring}")
-            info(f"Hextream  to send ({len(bitstring_hex)} characters): {bitstring_hex}")
+            # Chip expects rows in order row15...row0, each row as 5 bits (active bit and column number).
+            # Python integers are unbounded, so all 80 bits are packed into a single int.
+            xbar_bits = 0
+            for num, active in zip(row_numbers[::-1], row_active[::-1]):
+                xbar_bits = xbar_bits << 5 | active << 4 | num
+            bitstring = f"{xbar_bits:080b}"
+            bitstring_hex = f"{xbar_bits:020X}"
+            info("Bitstream to send (%d characters): %s", len(bitstring), bitstring)
+            info("Hextream  to send (%d characters): %s", len(bitstring_hex), bitstring_hex)
             instruct("X", hw['address'], bitstring_hex)
             #print(f"$ac->set_xbar('XBAR16', '{bitstring_hex}');")
         else:
@@ -482,6 +504,9 @@ def cli():
     print(instructions)
 
     if args.plot:
+        # Only writing a file, so skip probing for an interactive (GUI) backend
+        import matplotlib
+        matplotlib.use("Agg")
         plot_xbar(args.plot, circuit_title=circuit['title'])#, interactive_plotting=args.debug)
     
 if __name__ == "__main__":
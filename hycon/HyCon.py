@@ -66,9 +66,7 @@ is to activate logging on ``INFO`` level:
 """
 
 # All these modules are Python internals
-import sys, re, logging, time
-from collections import namedtuple
-from copy import deepcopy
+import re, logging, time
 
 #logging.basicConfig(level=logging.INFO) # only for testing
 log = logging.getLogger('HyCon') # or __name__
@@ -96,7 +94,7 @@ def ensure(var, **q):
     # Should probably use inspect.stack() or traceback.extract_stack() to get original varname
     basemsg=f"Got {var=}" if not 'basemsg' in q else q['basemsg']
     if 'eq' in q and not var == q['eq']: raise ValueError(f"{basemsg}, but should be '{q['eq']}'")
-    if 're' in q and not re.match(q['re'], var): raise ValueError(f"{basemsg}, but that doesn't match regexp '{q['re']}'")
+    if 're' in q and not re.match(q['re'], var): raise ValueError(f"{basemsg}, but that doesn't match regexp '{getattr(q['re'], 'pattern', q['re'])}'")
     if 'inrange' in q and not (var >= q['inrange'][0] and var <= q['inrange'][1]): raise ValueError(f"{basemsg}, but it is not in range{q['inrange']}.")
     if 'within' in q and not var in q['within']: raise ValueError(f"{basemsg}, but it is none of {q['within']}.")
     if 'length' in q and not len(var)==q['length']: raise ValueError(f"{basemsg}, of {len(var)=} but expected to be len(var)={q['length']}.")
@@ -115,18 +113,22 @@ class expect:
     >>> print(list(E(R)))
     [1, 2, 3]
     """
-    def __init__(self, **q): self.q=q
+    def __init__(self, **q):
+        self.q=q
+        # Compiled once, since an expectation is typically checked against many responses
+        self.regex = re.compile(q['re']) if 're' in q else None
     def __call__(self, r): # r: HyConRequest
-        q = deepcopy(self.q);
+        q = dict(self.q) # flat, so a shallow copy will do
         q['basemsg'] = f"Unexpected response: Command {r.command} yielded '{r.response}'"
+        if self.regex: q['re'] = self.regex
         ensure(r.response, **q)
         mapper = q['type'] if 'type' in q else lambda x:x # id
         try:
-            if 'ret' in q: return mapper(re.match(q['re'], r.response).groupdict()[ q['ret'] ])
+            if 'ret' in q: return mapper(self.regex.match(r.response).groupdict()[ q['ret'] ])
             if 'split' in q: return map(mapper, re.split(q['split'], r.response))
-            if 're' in q and not 'type' in q: return re.match(q['re'], r.response)
+            if 're' in q and not 'type' in q: return self.regex.match(r.response)
             return mapper(r.response)
-        except ValueError:  raise ValueError(f"{basemsg} but cannot be casted/mapped to {mapper}")
+        except ValueError:  raise ValueError(f"{q['basemsg']} but cannot be casted/mapped to {mapper}")
     def __str__(self): return "expect(%s)"%str(self.q)[1:-1].replace("'",'')
 
 def wont_implement(reason):
@@ -159,7 +161,7 @@ class HyConRequest:
         if self.executed:
             raise ValueError("Shall not execute same command twice.")
         self.executed = True
-        log.info(f"Sending [{self.command}]")
+        log.info("Sending [%s]", self.command) # lazy formatting, this runs for every request
         hycon.fh.write(self.command)
         return self # chainable
     
@@ -172,7 +174,7 @@ class HyConRequest:
         if not expected_response:
             log.debug("No response expected, skipping reading from HyCon...")
             return self # chainable
-        log.debug(f"Waiting for response {expected_response} ... ")
+        log.debug("Waiting for response %s ... ", expected_response)
         if read_again or not hasattr(self, "response"):
             self.response = hycon.fh.readline().strip() # Note: The HyConAVR always answers with a full line.
         if not self.response:
@@ -198,6 +200,7 @@ class HyCon:
     DPT_MAX_INT_VALUE = (2 ** DPT_RESOLUTION - 1)  # 0 <= value <= 1023
     XBAR_CONFIG_BYTES = 10
     MAX_RO_GROUP_SIZE = 500 # hardcoded in HyConAVR.ino
+    RX_BUFFER_SIZE = 64 # bytes, serial receive buffer of the Arduino running HyConAVR.ino
     
     def __init__(self, fh, unidirectional=False):
         """
@@ -229,9 +232,11 @@ class HyCon:
         "Create a request, run it and check the reply"
         return HyConRequest(*args, **kwargs).write(self).read(self)
     
-    def command(*args, help=None, **kwargs):
+    def command(command, expected_response=None, help=None):
         "Return a method which, when called, creates a request, runs it and checks the reply"
-        method = lambda self: self.query(*args, **kwargs)
+        # build the expectation only once instead of at every call
+        if isinstance(expected_response, str): expected_response = expect(re=expected_response)
+        method = lambda self: self.query(command, expected_response)
         method.__doc__ = help
         return method
     
@@ -276,8 +281,9 @@ class HyCon:
         q = self.query('l', "^No data!|.*$")
         if q.response == "No data!": return None
         data = []
+        line = expect(re=r"^([-\d\.\s]*|EOD)*$")
         while True:
-            resp = q.read(self, expect(re=r"^([-\d\.\s]*|EOD)*$"), read_again=True).response.split()
+            resp = q.read(self, line, read_again=True).response.split()
             if "EOD" in resp: break
             data.append(list(map(float, resp)))
         return data
@@ -309,11 +315,46 @@ class HyCon:
     
     read_mpts = wont_implement("because it is just a high-level function which calls pot_set and iterates a list of potentiometer address/names.")
     
-    def set_pt(self, address, number, value):
-        "Set a digital potentiometer by address/number."
+    def pt_request(self, address, number, value):
+        "Create (but don't run) the request for setting a digital potentiometer."
         ensure(value, inrange=(0,1))
         value = int(value * self.DPT_MAX_INT_VALUE) # 0000 <= value <= 1023
-        return self.query(f"P{address:04X}{number:02X}{value:04d}", expect(eq=f"P{address:X}.{number:X}={value:d}"))
+        return HyConRequest(f"P{address:04X}{number:02X}{value:04d}", expect(eq=f"P{address:X}.{number:X}={value:d}"))
+    
+    def set_pt(self, address, number, value):
+        "Set a digital potentiometer by address/number."
+        return self.pt_request(address, number, value).write(self).read(self)
+    
+    def set_pt_batch(self, pots):
+        """
+        Set a number of digital potentiometers, given as an iterable of ``(address, number, value)``
+        tuples. Returns the list of executed requests.
+        
+        If the connection has a truthy ``supports_batching`` attribute (such as
+        :class:`connections.tcpsocket`), several commands are sent at once (within a ``with fh:``
+        block) before their replies are read, which saves round trips. Since the connection
+        typically is only a bridge to the UART of the microcontroller, not more commands are
+        sent ahead than fit into its receive buffer (``RX_BUFFER_SIZE``).
+        Otherwise this is just a loop over :meth:`set_pt`.
+        
+        When sending at once, all replies are read before an unexpected one is reported
+        (by raising the first error), so that no reply is left over for later queries.
+        """
+        requests = [ self.pt_request(*pot) for pot in pots ]
+        if getattr(self.fh, "supports_batching", False) and requests:
+            in_flight = max(1, self.RX_BUFFER_SIZE // len(requests[0].command)) # all have the same length
+            failure = None
+            for i in range(0, len(requests), in_flight):
+                sent = requests[i:i+in_flight]
+                with self.fh:
+                    for r in sent: r.write(self)
+                for r in sent:
+                    try: r.read(self)
+                    except ValueError as e: failure = failure or e
+            if failure: raise failure
+        else:
+            for r in requests: r.write(self).read(self)
+        return requests
     
     def read_dpts(self):
         """
@@ -25,7 +25,8 @@ parts of Bernds auto-setup code to python in order to be able to use the
 same YAML files.
 """
 
-from collections import namedtuple, OrderedDict
+import re, functools
+from collections import namedtuple
 
 from .HyCon import HyCon
 
@@ -33,7 +34,7 @@ class DotDict(dict):
     """
     Small syntactic sugar: Dot notation to access to dictionary attributes, which is especially
     handy for deeply nested dicts. There are plenty of similar library for python around, but
-    this implementation is only five lines (yes, five). The following usage example is longer
+    this implementation is only a handful of lines. The following usage example is longer
     then the implementation:
     
     >>> a = { "b": 42, "non-identifier": 3, "foo": { "bar": { 3: 123 } }}
@@ -52,23 +53,58 @@ class DotDict(dict):
     >>> c.foo = "b"
     >>> c                     # also works for setting, not only reading
     {'foo': 'b'}
-    >>> c.bar = DotDict()
-    >>> c.bar.baz = "bla"     # Limitation for nested setting: create nested DotDicts first.
+    >>> c.bar = {}
+    >>> c.bar.baz = "bla"     # also works for nested setting
+    >>> c.pts = [{"x": 1}]    # dicts within lists are converted, too
+    >>> c.pts[0].x
+    1
+    >>> c["d"] = {"e": 2}     # as well as at item assignment, update and setdefault
+    >>> c.d.e
+    2
+    >>> c.update(f={"g": 3}); c.f.g
+    3
+    >>> c.setdefault("h", {"i": 4}).i
+    4
+    >>> c.nonexisting is None # missing keys read as None, handy for optional entries
+    True
+    >>> c.wrap = 5            # any key can be used, also if named like a helper
+    >>> c.wrap
+    5
     """
-    def __getattr__(*args):
-        val = dict.get(*args)
-        return DotDict(val) if type(val) is dict else val
-    __setattr__ = dict.__setitem__
+    __slots__ = () # all attributes are dict items, no need for a per-instance __dict__
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.update(*args, **kwargs) # wrap nested dicts once and not at every attribute access
+    def __getattr__(self, key):
+        return self.get(key)
+    def __setitem__(self, key, val): super().__setitem__(key, wrap_dicts(val))
+    def update(self, *args, **kwargs):
+        for key, val in dict(*args, **kwargs).items(): self[key] = val
+    def setdefault(self, key, default=None):
+        if key not in self: self[key] = default
+        return self[key]
+    __setattr__ = __setitem__
     __delattr__ = dict.__delitem__ 
 
+def wrap_dicts(val):
+    "Converts dicts, also when nested in lists, to DotDicts."
+    if type(val) is dict: return DotDict(val)
+    if type(val) is list: return [ wrap_dicts(v) for v in val ]
+    return val
+
 # This is tolen from ../fpaa/fpaa.py  . TODO: just import or so.
 def yaml_load(fname):
     # external dependencies, install with "pip install pyyaml"
     # If you don't have pip, install pip with "easy_install pip"
     import yaml # PyYAML
+    # The libyaml based loader is much faster but only available if PyYAML was built with libyaml
+    Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     
     with open(fname, "r") as cfh:
-        return yaml.load(cfh, Loader=yaml.SafeLoader) # may rise ScannerError
+        return yaml.load(cfh.read(), Loader=Loader) # may rise ScannerError
+
+# Text form of a PotentiometerAddress, for instance 0x200/2 or 0200/2 (both hex)
+_PT_RE = re.compile(r"(?:0[xX])?([0-9a-fA-F]+)/([0-9a-fA-F]+)")
 
 class PotentiometerAddress(namedtuple("PotentiometerAddress", ["address", "number"])):
     """
@@ -88,17 +124,32 @@ class PotentiometerAddress(namedtuple("PotentiometerAddress", ["address", "numbe
     @classmethod
     def fromText(cls, text):
         "Parses something like 0x200/2 to (0x200, 2). Will also accept 0200/2 as hex."
-        if not cls.isPotentiometerAddress(text):
-            raise ValueError("'%s' doesn't look like a valid potentiometer address. Should be like 0x200/2 or 0200/2", text)
-        address,number = text.split("/")
-        return cls(int(address,16), int(number,16))
+        match = isinstance(text,str) and cls._parse(text)
+        if not match:
+            raise ValueError("'%s' doesn't look like a valid potentiometer address. Should be like 0x200/2 or 0200/2" % (text,))
+        return match
+    @classmethod
+    @functools.lru_cache(maxsize=None) # element maps are parsed again at every (re)setup
+    def _parse(cls, text):
+        match = _PT_RE.fullmatch(text)
+        return cls(int(match[1],16), int(match[2],16)) if match else None
     @classmethod
     def isPotentiometerAddress(cls, text):
-        # should rather have a regexp or so...
-        return isinstance(text,str) and text.count("/") == 1 # or not "0x" in text:
+        return isinstance(text,str) and _PT_RE.fullmatch(text) is not None
     def toText(self):
         return "0x%x/%x" % (self.address,self.number)
 
+def potentiometer_settings(conf):
+    """
+    Collects the coefficients of the problem in conf as a list of ``(address, number, value)``
+    tuples, as expected by :meth:`HyCon.set_pt_batch`.
+    """
+    elements = conf["elements"]
+    try:
+        return [ (*PotentiometerAddress.fromText(elements[name]), value) for name, value in conf["problem"].get("coefficients", {}).items() ]
+    except KeyError as e:
+        raise KeyError("Unknown coefficient: '%s'. It is not part of the element map." % e.args[0])
+
 def autosetup(hycon, conf, reset=True):
     """
     hycon is expected to be an instance of HyCon.
@@ -129,19 +180,16 @@ def autosetup(hycon, conf, reset=True):
     #    sign = (value < 0)
     #    number = ...
 
-    try:
-        # Set potentiometer values (coefficients):
-        for name, value in problem.get("coefficients", {}).items():
-            dp = PotentiometerAddress.fromText(elements[name])
-            hycon.set_pt(dp.address, dp.number, value)
+    # Set potentiometer values (coefficients):
+    hycon.set_pt_batch(potentiometer_settings(conf))
 
+    try:
         # Define read out group if specified:
         if "ro-group" in problem:
-            # Remark: This will fail with weird "None" errors for elements in ro-group which are not defined.
-            addresses = list(map(elements.get, problem["ro-group"]))
+            addresses = [ elements[name] for name in problem["ro-group"] ]
             hycon.set_ro_group(addresses)
     except KeyError as e:
-        raise KeyError("Unknown coefficient or computing element: '%s'. It is not part of the element map." % e)
+        raise KeyError("Unknown computing element: '%s'. It is not part of the element map." % e.args[0])
         
     # Derive the required XBAR setup:
     #if (defined($self->{problem}) and defined($xbar_address)) {
@@ -217,19 +265,32 @@ class AutoConfHyCon(HyCon):
         self.autosetup()
         
     def autosetup(self, conf=None, reset=False):
-        if not conf: conf = self.conf
-        autosetup(self, conf, reset)
+        "Sets up the machine, following the current content of the configuration (or the given one)"
+        autosetup(self, conf or self.conf, reset)
+        
+    @property
+    def potentiometers(self):
+        "Potentiometer addresses by name, as currently given in the element map (parsing is cached)"
+        return { name: PotentiometerAddress.fromText(addr) for name,addr in self.conf.elements.items() \
+            if PotentiometerAddress.isPotentiometerAddress(addr) }
+
+    @property
+    def ro_group(self):
+        "Names of the read out group elements, as currently given in the configuration (or None)"
+        problem = self.conf.get("problem", {})
+        return tuple(problem["ro-group"]) if "ro-group" in problem else None
         
     def get_data_by_name(self):
         "Get readout group data handily labeled by name"
-        if not "ro-group" in self.conf.problem: raise ValueError("No Read-out group defined")
+        if not self.ro_group: raise ValueError("No Read-out group defined")
         data = self.get_data() # shape (sample_points, readout_group_length)
         if not data: return None
-        return OrderedDict( (name, [line[i] for line in data]) for i,name in enumerate(self.conf.problem["ro-group"]) )
+        columns = zip(*data) # transposed, shape (readout_group_length, sample_points)
+        return { name: list(column) for name, column in zip(self.ro_group, columns) }
     
     def set_pt_by_name(self, name, value):
         "Set a digital potentiometer by name"
-        dp = PotentiometerAddress.fromText(self.conf.elements[name])
+        dp = self.potentiometers[name]
         return self.set_pt(dp.address, dp.number, value)
 
     def read_element_by_name(self, name):
@@ -246,16 +307,11 @@ class AutoConfHyCon(HyCon):
         Returns single map of DPT name to value (as float).
         """
         floats = self.read_dpts()
-        interesting_potentiometers = \
-          { PotentiometerAddress.fromText(addr): name for name,addr in self.conf.elements.items() \
-            if PotentiometerAddress.isPotentiometerAddress(addr) }
-        named_values = {}
-        for p, name in interesting_potentiometers.items():
-            if p.address in floats and p.number < len(floats[p.address]):
-                named_values[name] = floats[p.address][p.number]
-        return named_values
+        return { name: values[p.number] for name, p in self.potentiometers.items() \
+                 if p.number < len(values := floats.get(p.address, ())) }
     
     def read_ro_group_by_name(self):
-        "Returns an OrderedDict of read-out group elements, with names"
-        req = self.read_ro_group()
-        return OrderedDict(zip(self.conf.problem["ro-group"], map(float,req.response.split(";"))))
+        "Returns a dictionary of read-out group elements, with names (in read-out group order)"
+        if not self.ro_group: raise ValueError("No Read-out group defined")
+        values = self.read_ro_group().reply # already mapped to floats by the expectation
+        return dict(zip(self.ro_group, values))
@@ -130,9 +130,12 @@ and ``stty ispeed 115200`` on Mac. Furthermore, when using this approach, consid
 writing a small wrapper which runs ``fh.flush()`` after writing.
 """
 
-import logging, time
+import logging, time, re
 log = logging.getLogger('connections')
 
+# Reply to the reset instruction. It may be preceded by noise (i.e. at UART startup)
+reset_reply = re.compile(r"RESET\r?\n")
+
 
 def repeated_reset(fh):
     """
@@ -146,18 +149,35 @@ def repeated_reset(fh):
     
     You can also call to this method with the :fun:`HyCon.HyCon.repeated_reset()` shorthand.
     
+    Instead of waiting a fixed time after each reset instruction, incoming lines are read until
+    the reply shows up or the attempt times out. The timeout starts small and grows exponentially
+    with every attempt. Connections which have a ``reset_input_buffer()``
+    method (such as :class:`serial`) get their stale input dropped before each attempt.
+    Connections with a settable read ``timeout`` in seconds (such as :class:`serial` and
+    :class:`tcpsocket`) get it lowered to the attempt timeout meanwhile, other connections
+    may block in ``readline()`` until a line arrives.
+    
     This function returns ``True`` when the connection suceeded, else ``False``.
     """
-    max_reset_attempts = 10
-    for i in range(max_reset_attempts):
-        log.info(f"Attempt {i}/{max_reset_attempts} to reset the controller/connection...")
-        fh.write("x")               # HyCon protocol reset instruction
-        if max_reset_attempts > 0:  # save time: If connection is stable, do not sleep...
-            time.sleep(1)           # ...otherwise sleep one second to allow reset
-        res = fh.readline()
-        if res == "RESET\n":
-            return True
-    log.warn("Could not properly reset the controller!")
+    max_reset_attempts = 20
+    has_timeout = hasattr(fh, "timeout")
+    if has_timeout: previous_timeout = fh.timeout
+    try:
+        for i in range(max_reset_attempts):
+            log.info(f"Attempt {i}/{max_reset_attempts} to reset the controller/connection...")
+            if hasattr(fh, "reset_input_buffer"): fh.reset_input_buffer()
+            fh.write("x")               # HyCon protocol reset instruction
+            # In seconds, adds up to ~1.7sec for all attempts. A readline started just before
+            # the deadline may take another attempt_timeout, so it is at most ~3.3sec in total.
+            attempt_timeout = min(0.005 * 2**i, 0.1)
+            if has_timeout: fh.timeout = attempt_timeout
+            deadline = time.monotonic() + attempt_timeout
+            while time.monotonic() < deadline:
+                if reset_reply.search(fh.readline()):
+                    return True
+    finally:
+        if has_timeout: fh.timeout = previous_timeout
+    log.warning("Could not properly reset the controller!")
     return False
 
 class human:
@@ -166,24 +186,86 @@ class human:
     def readline(self): return input("[type reply of uC]>> ")
 
 class tcpsocket:
-    "Wrapper for communicating with HyCon over TCP/IP. See also HyCon-over-TCP.README for further instructions"
-    def __init__(self, host, port):
-        from socket import socket # builtin
+    """
+    Wrapper for communicating with HyCon over TCP/IP. See also HyCon-over-TCP.README for further instructions
+    
+    Writes can be collected and sent with a single system call by using the instance as a
+    context manager:
+    
+    >>> with sock:                                           # doctest: +SKIP
+    ...     for cmd in ["i", "o", "h"]: sock.write(cmd)
+    
+    Collected writes are also sent when they exceed ``bufsize``, when reading a line
+    (since the reply cannot come before the request was sent) or by calling ``flush()``.
+    The ``with`` blocks can be nested, collecting ends with the outermost one.
+    
+    Reading blocks until a line arrives, unless a ``timeout`` in seconds is set. Then
+    ``readline()`` returns an empty string when it runs out, just like :class:`serial`.
+    """
+    supports_batching = True # HyCon may send several commands before reading the replies
+    
+    def __init__(self, host, port, bufsize=64*1024):
+        "bufsize is the maximum size of a single read or collected write, large read out data benefit from a large one."
+        from socket import socket, timeout, IPPROTO_TCP, TCP_NODELAY # builtin
+        self.timed_out = timeout # exception raised by recv when the timeout runs out
+        self.buf = bytearray()
+        self.batching = 0 # depth of nested with blocks
+        self.bufsize = bufsize
+        self.rbuf = bytearray() # received but not yet returned by readline
         self.s = socket()
         self.s.connect((host,port))
-        self.fh = self.s.makefile(mode="rw", encoding="utf-8")
+        # HyCon commands are only a few bytes each, don't let Nagle hold them back
+        self.s.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
         log.info(f"Connected to TCP {host}:{port}")
         
         repeated_reset(self)
     def write(self, sth):
         "Expects sth to be a string"
-        self.s.sendall(sth.encode("ascii"))
+        if self.batching:
+            self.buf += sth.encode("ascii")
+            if len(self.buf) >= self.bufsize: self.flush()
+        else: self.s.sendall(sth.encode("ascii"))
+    def flush(self):
+        "Sends collected writes, if any"
+        if self.buf:
+            self.s.sendall(self.buf)
+            self.buf.clear()
     def readline(self):
-        # instead also: self.s.recv(123)
-        return self.fh.readline()
+        self.flush()
+        # The HyCon protocol is plain ASCII, so only complete lines need to be decoded
+        searched = 0
+        while (end := self.rbuf.find(b"\n", searched) + 1) == 0:
+            searched = len(self.rbuf)
+            try: chunk = self.s.recv(self.bufsize)
+            except self.timed_out: return "" # an incomplete line stays in rbuf
+            if not chunk: # connection closed, return what is left
+                end = len(self.rbuf)
+                break
+            self.rbuf += chunk
+        line = self.rbuf[:end].decode("ascii")
+        del self.rbuf[:end]
+        return line
+    @property
+    def timeout(self):
+        "Read timeout in seconds, or None to block"
+        return self.s.gettimeout()
+    @timeout.setter
+    def timeout(self, seconds):
+        self.s.settimeout(seconds)
+    def __enter__(self):
+        self.batching += 1
+        return self
+    def __exit__(self, *exc_info):
+        self.batching -= 1
+        if not self.batching: self.flush()
     
 class serial:
-    "Small wrapper for making the use of PySerial more handy (no need for extra import)"
+    """
+    Small wrapper for making the use of PySerial more handy (no need for extra import)
+    
+    In contrast to :class:`tcpsocket`, writes are not collected, so HyCon does not send
+    several commands before reading their replies over serial.
+    """
     def __init__(self, port, baudrate, **passed_options):
         try:
             from serial import Serial  # requires pyserial
@@ -195,10 +277,20 @@ class serial:
             **passed_options)
         log.info(f"Connected to serial port {port} with {baudrate} baud")
 
+        # Opening the port resets an Arduino, give its bootloader time to start the firmware
+        time.sleep(1)
         repeated_reset(self) # this is crucial for direct serial connections
         
     def write(self, sth):
         self.s.write(sth.encode("ascii"))
     def readline(self):
         return self.s.readline().decode("ascii")
-            
+    def reset_input_buffer(self):
+        self.s.reset_input_buffer()
+    @property
+    def timeout(self):
+        "Read timeout in seconds"
+        return self.s.timeout
+    @timeout.setter
+    def timeout(self, seconds):
+        self.s.timeout = seconds
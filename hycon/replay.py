@@ -38,10 +38,12 @@ special scenarios such as:
 * Validating the correctness of high-level HyCon instructions
   (such as emitted by the PyFPAA or autosetup codes)
 
-The code basically implements a character-by-character tokenizer/parser.
+The code basically implements a command-by-command tokenizer/parser.
 It is built based on a simple mapping datastructure which assigns each
 one-letter command the respective PyHyCon method name. Furthermore,
-method arguments can be read and converted.
+method arguments can be read and converted. The arguments of each
+command are described by regular expressions which are compiled once,
+so reading a command with all its arguments is a single regexp match.
 
 It would be nice to join HyCon.py and replay.py to a single file which
 translates between the serial protocol and the OOP API calls. The transformation
@@ -51,100 +53,90 @@ bigger interest.
 The ordering follows the AVR Ino code.
 """
 
-import sys, io, functools
+import sys, io, re, contextlib
 identity = lambda x:x
 
 from .HyCon import HyCon
 
 
-def delayed(static_method):
+class argument:
     """
-    This is a decorator for a static method in a class. It will
-    make the function body "delayed", i.e. when calling the function,
-    a future/promise/delay/deferred element is returned.
-    Some parameter bounding (closure) happens: The decorated arguments
-    are evaluated early while the later execution expects only a single
-    reader argument. Example to follow the logic:
+    A single argument of a HyCon command. It is described by a regular expression
+    ``pattern`` (which must not contain capturing groups) for its text representation
+    and a ``convert`` function which maps the matched text to a python value.
+    ``max_length`` is the longest text the pattern can match (if known), it allows to
+    tell a malformed argument from one which is not yet completely read.
+    Calling an argument does both:
     
-    >>> f = lambda a,b,c,d: print(a,b,c,d)
-    >>> g = delayed(f)
-    >>> h = g(1,2,3)
-    >>> h(4)
-    4 1 2 3
+    >>> consume.hex(2)("ff")
+    255
+    >>> consume.hex(2)("xx")
+    Traceback (most recent call last):
+    ...
+    ValueError: Could not read 'xx' as argument of form '[0-9a-fA-F]{2}'.
     """
-    @functools.wraps(static_method)
-    def decorated(*w,**kw):
-        def deferred(reader):
-            return static_method(reader, *w, **kw)
-        #deferred.__name__ = f"{static_method.__name__}({str(w)[1:-1]}{',' if kw else ''}{str(kw)[1:-1]})"
-        return deferred
-    return decorated
+    def __init__(self, pattern, convert, max_length=None):
+        self.pattern, self.convert, self.max_length = pattern, convert, max_length
+    def __call__(self, text):
+        if not re.fullmatch(self.pattern, text):
+            raise ValueError(f"Could not read '{text}' as argument of form '{self.pattern}'.")
+        return self.convert(text)
+
+def digit_class(base):
+    "Regular expression character class for a single digit in some base"
+    if base <= 10: return f"[0-{base-1}]"
+    last = "abcdefghijklmnopqrstuvwxyz"[base-11]
+    return f"[0-9a-{last}A-{last.upper()}]"
 
 class consume:
     """
     Consume is an ugly namespace and not a class, actually.
-    The basic idea of these (static!) functions is to be
-    called delayedly with a function as it's argument which
-    acts like the io.IOBase.read() function, i.e. advances
-    an internal cursor (side effect) and returns *n* characters
-    from the stream. Crude Example:
+    Its (static!) functions describe the arguments of the HyCon commands
+    and return :class:`argument` instances. Crude Example:
     
     >>> tokenizer = [consume.exact("test"), consume.decimals(3), consume.exact("foo"), consume.hex(2)]
-    >>> test = io.StringIO("test123fooAA")
-    >>> reader = test.read
-    >>> [ token(reader) for token in tokenizer ]
+    >>> [ token(text) for token, text in zip(tokenizer, ["test", "123", "foo", "AA"]) ]
     ['test', 123, 'foo', 170]
     """
-    @delayed
-    def exact(reader, text):
-        proof = reader(len(text))
-        if proof != text: raise ValueError(f"Expected '{text}' but got '{proof}'.")
-        return text
-    @delayed
-    def number(reader, digits, base, multiply=1):
+    def exact(text):
+        return argument(re.escape(text), lambda matched: text, len(text))
+    def number(digits, base, multiply=1):
         """
         Reads a number with #digit digits in some base. Can perform a multiplication afterwards.
         
-        >>> consume.number(8,16)(io.StringIO("deadbeef").read)
+        >>> consume.number(8,16)("deadbeef")
         3735928559
-        >>> consume.number(2,10,multiply=2)(io.StringIO("42").read)
+        >>> consume.number(2,10,multiply=2)("42")
         84
         """
-        text = reader(digits)
-        if not text: raise ValueError(f"Encountered end of input but expected {digits} digits in base {base}")
-        try: return int(text,base) * multiply
-        except ValueError as e: raise ValueError(f"Could not cast '{text}' as a base-{base} number.")
-    @delayed
-    def decimals(reader, number_of_digits):
-        return consume.number(number_of_digits, 10)(reader)
-    @delayed
-    def hex(reader, number_of_digits):
-        return consume.number(number_of_digits, 16)(reader)
-    @delayed
-    def list(reader, split, end, digits, base):
+        return argument(f"{digit_class(base)}{{{digits}}}", lambda text: int(text,base) * multiply, digits)
+    def decimals(number_of_digits):
+        return consume.number(number_of_digits, 10)
+    def hex(number_of_digits):
+        return consume.number(number_of_digits, 16)
+    def hexstring(number_of_digits):
+        "Reads hex digits but keeps them as a string"
+        return argument(f"{digit_class(16)}{{{number_of_digits}}}", identity, number_of_digits)
+    def list(split, end, digits, base, max_items=HyCon.MAX_RO_GROUP_SIZE):
         """
         Reads a list of numbers. Limitations:
         * Always expects end token to come
         * All numbers must have same number of digits (and same base)
         * Cannot handle empty list or and won't accept end-of-file before end token.
+        * Longer lists than ``max_items`` are not rejected by the pattern, but will not be
+          waited for when reading streams.
         
         Examples:
         
-        >>> consume.list(split=",",digits=1,base=10,end=".")(io.StringIO("1,5,2,3,9.").read)
+        >>> consume.list(split=",",digits=1,base=10,end=".")("1,5,2,3,9.")
         [1, 5, 2, 3, 9]
-        >>> consume.list(split=":",digits=2,base=16,end=";")(io.StringIO("5a:88:ff:ff;").read)
+        >>> consume.list(split=":",digits=2,base=16,end=";")("5a:88:ff:ff;")
         [90, 136, 255, 255]
         """
-        assert len(split) == len(end)
-        retlst = []
-        while True:
-            retlst.append( consume.number(digits, base)(reader) )
-            #print(f"List: {retlst}")
-            sep = reader(len(split))
-            #print(f"Sep: '{sep}'")
-            if sep == end: break
-            elif sep != split: raise ValueError(f"Unexpected character(s) or end of stream: '{sep}'")
-        return retlst
+        number = f"{digit_class(base)}{{{digits}}}"
+        pattern = f"(?:{number}{re.escape(split)})*{number}{re.escape(end)}"
+        max_length = max_items * (digits + len(split)) - len(split) + len(end)
+        return argument(pattern, lambda text: [ int(n, base) for n in text[:-len(end)].split(split) ], max_length)
 
 not_implemented = lambda comment: ("NOT_IMPLEMENTED", comment)
 
@@ -175,18 +167,54 @@ mapping = {
     "S": "pot_set",
     "t": "get_op_time",
     "x": "reset",
-    "X": ("set_xbar", consume.hex(4), consume.hex(HyCon.XBAR_CONFIG_BYTES*2)),
+    "X": ("set_xbar", consume.hex(4), consume.hexstring(HyCon.XBAR_CONFIG_BYTES*2)),
     "?": not_implemented("Prints help")
 }
 
+def compile_command(rhs):
+    """
+    Compiles the right hand side of a mapping entry to a parser function. The parser
+    expects a string and the position where the command arguments start. It returns
+    the command (as in the mapping, but with read arguments) and the position after
+    the arguments, or ``None`` if the arguments cannot be read. The longest text the
+    arguments can have is stored as ``max_length`` of the parser (``None`` if unknown).
+    
+    >>> parse = compile_command(("set_pt", consume.hex(4), consume.hex(2), 42))
+    >>> parse("P020001", 1)
+    (('set_pt', 512, 1, 42), 7)
+    >>> parse("P02", 1) is None
+    True
+    >>> parse.max_length
+    6
+    """
+    if not isinstance(rhs, tuple) or not any(isinstance(r, argument) for r in rhs):
+        parse = lambda text, pos: (rhs, pos)
+        parse.max_length = 0
+        return parse
+    # Constants (such as the method name) get an empty group, so groups and rhs line up
+    regex = re.compile("".join(f"({r.pattern})" if isinstance(r, argument) else "()" for r in rhs))
+    converters = [ r.convert if isinstance(r, argument) else (lambda text, r=r: r) for r in rhs ]
+    def parse(text, pos):
+        match = regex.match(text, pos)
+        if not match: return None
+        return tuple([ convert(t) for convert, t in zip(converters, match.groups()) ]), match.end()
+    lengths = [ r.max_length for r in rhs if isinstance(r, argument) ]
+    parse.max_length = None if None in lengths else sum(lengths)
+    return parse
+
+def compile_mapping(mapping):
+    "Compiles all entries of a mapping, see :func:`compile_command`"
+    return { command: compile_command(rhs) for command, rhs in mapping.items() }
+
+default_parsers = compile_mapping(mapping)
+
 class HyConRequestReader:
     """
     Converts HyCon "configuration strings" to high level API calls.
     This can be seen as the inverse operation to calling the HyCon.
     
-    Instances of this class act as iterator. It will consume the
-    incoming stream character by character (or the whole string, if
-    given as a string).
+    Instances of this class act as iterator. Each command is read with its arguments
+    in one step, by a regular expression compiled from the ``mapping``.
     
     Example:
     
@@ -203,36 +231,64 @@ class HyConRequestReader:
     >>> replay(hc, commands)
     >>> replayed.getvalue() == instructions
     True
-    """
-    def __init__(self, stream_or_string, mapping=mapping):
-        self.subject = io.StringIO(stream_or_string) if isinstance(stream_or_string, str) else stream_or_string
-        self.shadow = io.StringIO()
-        self.mapping = mapping
     
-    def read(self, size=-1):
-        ret = self.subject.read(size)
-        self.shadow.write(ret)
-        return ret
+    Streams (text or binary) are read incrementally, so commands are returned as soon as
+    they are complete, which allows to inspect a live instruction stream. If the stream
+    has a ``read1`` method (such as binary files, ``sys.stdin.buffer`` or pipes opened
+    with ``os.fdopen(fd, "rb")``), whatever is available is read. Otherwise, ``read`` is
+    called with ``chunksize``, which may wait for a full chunk on text streams of pipes.
+    Malformed arguments are reported as soon as more characters are read than the
+    longest valid arguments of the command have, or at the end of the stream.
+    
+    >>> list(HyConRequestReader(io.BytesIO(b"xX0040000000021084000078")))
+    Traceback (most recent call last):
+    ...
+    ValueError: Could not read the arguments of command 'X'. Encountered after having read 1 characters 'x'
+    """
+    def __init__(self, stream_or_string, mapping=None, chunksize=4096):
+        if isinstance(stream_or_string, str):
+            self.buf, self.stream = stream_or_string, None
+        else:
+            self.buf, self.stream = "", stream_or_string
+            # prefer reading whatever is available over waiting for a full chunk
+            self.read = getattr(stream_or_string, "read1", stream_or_string.read)
+        self.chunksize = chunksize
+        self.pos = 0
+        self.consumed = 0 # characters dropped from the beginning of buf
+        self.parsers = compile_mapping(mapping) if mapping else default_parsers
     
     def debugline(self):
-        read_in = self.shadow.getvalue()
-        return f"Encountered after having read {len(read_in)} characters '{read_in}'"
-        
-    def read_arguments(self, rhs):
-        if isinstance(rhs, tuple):
-            return tuple(map(self.read_arguments, rhs))
-        if callable(rhs):
-            res = rhs(self.read)
-            return res
-        return rhs
+        read_in = self.buf[:self.pos]
+        return f"Encountered after having read {self.consumed + len(read_in)} characters '{read_in}'"
+    
+    def read_more(self):
+        "Appends the next chunk of the stream to the buffer. Returns False at the end of the stream."
+        if not self.stream: return False
+        chunk = self.read(self.chunksize)
+        if not chunk:
+            self.stream = None # end of input
+            return False
+        self.consumed += self.pos # drop what was already read, the buffer only holds the current command
+        self.buf = self.buf[self.pos:] + (chunk if isinstance(chunk, str) else chunk.decode("ascii"))
+        self.pos = 0
+        return True
 
     def read_command(self):
-        command = self.read(1)
-        if not command:
-            raise StopIteration # end of input
-        if command not in self.mapping:
+        while self.pos >= len(self.buf):
+            if not self.read_more():
+                raise StopIteration # end of input
+        command = self.buf[self.pos]
+        parse = self.parsers.get(command)
+        if not parse:
             raise ValueError(f"Command '{command}' not part of the valid HyCon command characters. {self.debugline()}")
-        return self.read_arguments(self.mapping[command])
+        # A failed match can also mean that the arguments are not yet completely read.
+        # Matches cannot end early, since all arguments have a fixed length or an end token.
+        while not (parsed := parse(self.buf, self.pos+1)):
+            too_long = parse.max_length is not None and len(self.buf) - self.pos - 1 >= parse.max_length
+            if too_long or not self.read_more():
+                raise ValueError(f"Could not read the arguments of command '{command}'. {self.debugline()}")
+        rhs, self.pos = parsed
+        return rhs
 
     # act as an iterator
     __iter__ = identity
@@ -261,8 +317,19 @@ def replay(hycon, commands):
     xiohaARt
     
     This works for almost any useful instruction stream.
+    
+    If the connection of the hycon supports batching (such as
+    :class:`connections.tcpsocket`), writes are collected and sent with fewer system calls.
+    Reading a reply still sends the collected writes before, so no command is sent
+    earlier than without batching: Each command expecting a reply is answered before
+    the next one goes out.
     """
-    for command in commands:
-        if not isinstance(command, tuple): command = (command,)
-        method,*args = command        # LISP-like unpacking (command, *args)
-        getattr(hycon, method)(*args) # calling
+    fh = getattr(hycon, "fh", None)
+    batch = fh if getattr(fh, "supports_batching", False) else contextlib.nullcontext()
+    bound = {} # method name -> bound method, looked up only once per replay
+    with batch:
+        for command in commands:
+            if not isinstance(command, tuple): command = (command,)
+            method,*args = command        # LISP-like unpacking (command, *args)
+            if method not in bound: bound[method] = getattr(hycon, method)
+            bound[method](*args)          # calling
@@ -8,6 +8,7 @@ in same data
 import dda.computing_elements as dda
 import dda.cpp_exporter as cpp
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest # pytest.raises
 
@@ -39,8 +40,11 @@ def test_similar_dtypes():
     #
     # so these examples are all with return_ndarray=True
     
-    ascii_data   = cpp.run(arguments={'max_iterations': N, "rk_order": 4})
-    binary_data  = cpp.run(arguments={'max_iterations': N, "rk_order": 4}, binary=True)
+    # both runs are independent subprocesses, so let them run side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ascii_run    = executor.submit(cpp.run, arguments={'max_iterations': N, "rk_order": 4})
+        binary_run   = executor.submit(cpp.run, arguments={'max_iterations': N, "rk_order": 4}, binary=True)
+        ascii_data, binary_data = ascii_run.result(), binary_run.result()
 
     ascii_plain  = cpp.numpy_read(ascii_data, return_recarray=False )
     ascii_rec    = cpp.numpy_read(ascii_data, return_recarray=True )
@@ -64,4 +68,42 @@ def test_similar_dtypes():
     assert ascii_rec.shape    == binary_rec.shape
 
     assert np.allclose(ascii_plain, binary_plain)
-    assert all(np.allclose(ascii_rec[name], binary_rec[name])  for name in ascii_rec.dtype.names)
+    # all fields are float64, so the records can be compared as one (N, fields) array
+    as_table = lambda rec: rec.view((np.float64, len(rec.dtype.names)))
+    assert np.allclose(as_table(ascii_rec), as_table(binary_rec))
+
+@pytest.fixture
+def empty_compile_cache(monkeypatch):
+    "Compiles of other tests shall neither be skipped nor be remembered afterwards"
+    monkeypatch.setattr(cpp, "_compiled", {})
+
+def test_compile_skips_unchanged_code(tmp_path, monkeypatch, empty_compile_cache):
+    # instead of running g++, just count the calls and create the binary
+    commands = []
+    def fake_compiler(command):
+        commands.append(command)
+        with open("a.out", "w") as fh: print(len(commands), file=fh) # relative to the cwd, as g++
+        return 0
+    monkeypatch.setattr(cpp, "_run_compiler", fake_compiler)
+    monkeypatch.chdir(tmp_path)
+    
+    code = "int main() {}"
+    cpp.compile(code)
+    cpp.compile(code)
+    assert len(commands) == 1 # same code and command: no recompilation
+    
+    cpp.compile(code + "\n// changed")
+    assert len(commands) == 2 # code changed
+    cpp.compile(code + "\n// changed", options="--std=c++17 -O2")
+    assert len(commands) == 3 # command changed
+    
+    (tmp_path / "a.out").unlink()
+    cpp.compile(code + "\n// changed", options="--std=c++17 -O2")
+    assert len(commands) == 4 # binary was removed
+    
+    # the same relative ./a.out in another directory is another binary
+    other = tmp_path / "other"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    cpp.compile(code + "\n// changed", options="--std=c++17 -O2")
+    assert len(commands) == 5
@@ -108,6 +108,23 @@ def test_sinusodial_diff():
     assert np.allclose( -np.cos(t[1:]), d["diff_out"][1:], atol=1e-1)
     pass
 
+def test_without_diff_same_as_with_diff():
+    # Without any diff(...), the solver skips computing the differences. The
+    # integrated variables must come out exactly as with the differences computed.
+    y, my, mdy = symbols("y, my, mdy")
+    def setup(with_diff):
+        s = State()
+        s[my]  = dda.neg(y)
+        s[y]   = dda.int(mdy, dt, 0)
+        s[mdy] = dda.int(my, dt, 1)
+        if with_diff: s[diff_out] = dda.diff(y, dt, 0) # not used by the others
+        return s
+    assert "any_differentiation = false" in setup(False).export(to="C++")
+    assert "any_differentiation = true"  in setup(True).export(to="C++")
+    _, without = run(setup(False))
+    _, with_diff = run(setup(True))
+    for name in ("y", "my", "mdy"):
+        assert np.array_equal(without[name], with_diff[name])
 
 # interactive testing goes like:
 """
@@ -52,6 +52,10 @@ N = t_final / dt
 assert N == int(N)
 N = int(N)  # np.linspace requires an integer
 
+# analytic solution at the output times, only dependent on the numbers above
+time = np.arange(t_initial, t_final, dt) + dt
+yanalytic = -np.exp(-time)
+
 def setup_state(alpha=-1., y0=+1.):
     # parameters of problem: slope and initial value
 
@@ -73,9 +77,6 @@ def run_simulation():
 def test_run_simulation():
     output = run_simulation()
     ysim = output["y"]
-
-    time = np.arange(t_initial, t_final, dt) + dt
-    yanalytic = -np.exp(-time)
     
     relative_tolerance = 1e-1 # which is pretty bad, actually
     
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+"""
+Tests of the HyCon request/reply handling, without hardware: The connection
+is a fake which records the written commands and plays back prepared replies.
+"""
+
+from hycon import HyCon
+from hycon.connections import tcpsocket, serial
+from hycon.replay import HyConRequestReader, replay
+import io, os
+import importlib
+autosetup = importlib.import_module("hycon.autosetup") # the hycon package exports a function of the same name
+import socket, threading, time
+
+import pytest # pytest.raises
+
+class FakeConnection:
+    "Records writes, returns the given replies line by line"
+    supports_batching = True
+    def __init__(self, *replies):
+        self.written = []
+        self.replies = list(replies)
+    def write(self, sth): self.written.append(sth)
+    def readline(self): return self.replies.pop(0) + "\n" if self.replies else ""
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): pass
+
+def test_set_pt_batch_reads_all_replies_on_failure():
+    fh = FakeConnection("P200.0=511", "BROKEN", "P200.2=511", "T_IC=10")
+    hc = HyCon(fh)
+    with pytest.raises(ValueError, match="BROKEN"):
+        hc.set_pt_batch([ (0x200, n, 0.5) for n in range(3) ])
+    assert fh.written == ["P0200000511", "P0200010511", "P0200020511"]
+    # the next query gets its own reply and not a left over one
+    assert hc.set_ic_time(10).reply == "T_IC=10"
+
+def test_set_pt_batch_limits_commands_in_flight():
+    class LoggingConnection(FakeConnection):
+        def readline(self):
+            self.written.append("read")
+            return super().readline()
+    replies = [ f"P200.{n:X}=511" for n in range(12) ]
+    fh = LoggingConnection(*replies)
+    HyCon(fh).set_pt_batch([ (0x200, n, 0.5) for n in range(12) ])
+    # P commands have 11 bytes, so 5 fit into the 64 byte receive buffer of the firmware
+    sent_ahead, pending = [], 0
+    for event in fh.written:
+        if event != "read": pending += 1
+        elif pending: sent_ahead.append(pending); pending = 0
+    assert sent_ahead == [5, 5, 2]
+
+@pytest.fixture
+def tcp_server():
+    "A TCP server which answers resets and records everything else it receives"
+    server = socket.create_server(("127.0.0.1", 0))
+    received = bytearray()
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            while chunk := conn.recv(1024):
+                if b"x" in chunk: conn.sendall(b"RESET\n")
+                else: received.extend(chunk)
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname(), received
+    server.close()
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline: time.sleep(0.01)
+    return condition()
+
+def test_tcpsocket_reset_times_out_on_silent_server():
+    with socket.create_server(("127.0.0.1", 0)) as server: # accepts, but never replies
+        start = time.monotonic()
+        sock = tcpsocket(*server.getsockname())
+        assert time.monotonic() - start < 5
+        assert sock.timeout is None # readline blocks again after the reset
+        sock.s.close()
+
+def test_tcpsocket_nested_batching(tcp_server):
+    (host, port), received = tcp_server
+    sock = tcpsocket(host, port)
+    with sock:
+        sock.write("i")
+        with sock: sock.write("o")
+        sock.write("h") # still collected after the inner block
+        assert sock.buf == b"ioh"
+        assert not received
+    assert not sock.buf
+    assert wait_for(lambda: received == b"ioh")
+
+def test_tcpsocket_flushes_within_batch(tcp_server):
+    (host, port), received = tcp_server
+    sock = tcpsocket(host, port, bufsize=4)
+    sock.s.settimeout(2) # fail instead of waiting for a reply to an unsent request
+    with sock:
+        sock.write("x")
+        assert sock.readline() == "RESET\n" # reading sends the collected request before
+        sock.write("ab")
+        sock.write("cd") # reaches bufsize
+        assert not sock.buf
+    assert wait_for(lambda: received == b"abcd")
+
+def test_serial_set_pt_batch_waits_for_replies(monkeypatch):
+    pyserial = pytest.importorskip("serial") # PySerial
+    events = []
+    class FakeSerial:
+        "Stands in for PySerial's Serial, answers resets and potentiometer settings"
+        def __init__(self, port, baudrate, **options): self.timeout = options["timeout"]
+        def write(self, data):
+            events.append(bytes(data))
+            self.reply = b"RESET\n" if data == b"x" else b"P200.%d=511\n" % int(data[5:7], 16)
+        def readline(self):
+            events.append("read")
+            return self.reply
+        def reset_input_buffer(self): pass
+    monkeypatch.setattr(pyserial, "Serial", FakeSerial)
+    hc = HyCon(serial("/dev/null", 115200))
+    events.clear()
+    hc.set_pt_batch([ (0x200, n, 0.5) for n in range(3) ])
+    # no command is sent before the reply of the previous one was read
+    assert events == [b"P0200000511", "read", b"P0200010511", "read", b"P0200020511", "read"]
+
+class RespondingConnection(FakeConnection):
+    "Answers the commands sent by autosetup like the HyCon firmware does"
+    def write(self, sth):
+        super().write(sth)
+        if sth[0] == "P":
+            address, number, value = int(sth[1:5], 16), int(sth[5:7], 16), int(sth[7:11])
+            self.replies.append(f"P{address:X}.{number:X}={value}")
+        elif sth[0] in "Cc":
+            self.replies.append(f"T_{'IC' if sth[0] == 'C' else 'OP'}={int(sth[1:])}")
+        # set_ro_group (G) expects no reply
+
+def autoconf_hycon(monkeypatch, conf):
+    fh = RespondingConnection()
+    monkeypatch.setattr(autosetup, "autoconnect", lambda conf: fh)
+    return autosetup.AutoConfHyCon(conf), fh
+
+def example_conf():
+    return {
+        "elements": { "alpha": "0200/0", "beta": "0200/1", "x": 0x0160, "y": 0x0161 },
+        "problem": { "times": { "ic": 10, "op": 20 }, "coefficients": { "alpha": 0.5 }, "ro-group": ["x"] },
+    }
+
+def test_autosetup_follows_edited_ro_group(monkeypatch):
+    hc, fh = autoconf_hycon(monkeypatch, example_conf())
+    assert "G0160." in fh.written
+    hc.conf.problem["ro-group"] = ["y", "x"]
+    fh.written.clear()
+    hc.autosetup()
+    assert "G0161;0160." in fh.written
+    assert hc.ro_group == ("y", "x")
+
+def test_autosetup_unknown_ro_group_element(monkeypatch):
+    conf = example_conf()
+    conf["problem"]["ro-group"] = ["x", "nonexisting"]
+    with pytest.raises(KeyError, match="Unknown computing element: 'nonexisting'"):
+        autoconf_hycon(monkeypatch, conf)
+
+def test_autosetup_follows_edited_coefficients(monkeypatch):
+    hc, fh = autoconf_hycon(monkeypatch, example_conf())
+    assert [ w for w in fh.written if w[0] == "P" ] == ["P0200000511"]
+    hc.conf.problem.coefficients.alpha = 0.25
+    hc.conf.problem.coefficients.beta = 1
+    fh.written.clear()
+    hc.autosetup()
+    assert [ w for w in fh.written if w[0] == "P" ] == ["P0200000255", "P0200011023"]
+
+def test_set_pt_by_name_follows_edited_elements(monkeypatch):
+    hc, fh = autoconf_hycon(monkeypatch, example_conf())
+    hc.conf.elements.alpha = "0300/2"
+    fh.written.clear()
+    hc.set_pt_by_name("alpha", 0.5)
+    assert fh.written == ["P0300020511"]
+    assert hc.potentiometers["alpha"].address == 0x0300
+
+@pytest.mark.parametrize("text", ["0200", "0200/2/1", 0x0200, ["0200/2"], {"address": "0200/2"}, None])
+def test_potentiometer_address_rejects_invalid_input(text):
+    with pytest.raises(ValueError, match="valid potentiometer address"):
+        autosetup.PotentiometerAddress.fromText(text)
+
+def record(hc):
+    "Some typical instructions, as written by a HyCon session"
+    hc.reset()
+    hc.set_ic_time(100)
+    hc.set_op_time(15000)
+    hc.set_pt(0x200, 0, 0.2)
+    hc.set_pt_batch([ (0x300, 3, 0), (0x300, 4, 1) ])
+    hc.set_xbar(0x0040, "0000000210840000781B")
+    hc.set_ro_group([0x362, 0x363, 0x220])
+    hc.digital_output(3, True)
+    hc.digital_output(2, False)
+    hc.ic(); hc.op(); hc.halt()
+
+def recorded_log():
+    log = io.StringIO()
+    record(HyCon(log, unidirectional=True))
+    return log.getvalue()
+
+def test_replay_roundtrip():
+    log = recorded_log()
+    commands = list(HyConRequestReader(log))
+    assert commands[:3] == ["reset", ("set_ic_time", 100), ("set_op_time", 15000)]
+    assert ("set_xbar", 0x40, "0000000210840000781B") in commands
+    assert ("set_ro_group", [0x362, 0x363, 0x220]) in commands
+    replayed = io.StringIO()
+    replay(HyCon(replayed, unidirectional=True), commands)
+    assert replayed.getvalue() == log
+
+@pytest.mark.parametrize("chunksize", [1, 3, 4096])
+def test_replay_reads_streams_in_chunks(chunksize):
+    log = recorded_log()
+    for stream in (io.StringIO(log), io.BytesIO(log.encode("ascii"))):
+        assert list(HyConRequestReader(stream, chunksize=chunksize)) == list(HyConRequestReader(log))
+
+def test_replay_reports_malformed_command_on_live_stream():
+    r, w = os.pipe()
+    with os.fdopen(r, "rb") as reader_end, os.fdopen(w, "wb", buffering=0) as writer_end:
+        watchdog = threading.Timer(5, writer_end.close)
+        watchdog.start()
+        reader = HyConRequestReader(reader_end)
+        writer_end.write(b"iP02zz002041") # as long as a valid set_pt command
+        assert next(reader) == "ic"
+        with pytest.raises(ValueError, match="Could not read the arguments of command 'P'"):
+            next(reader)
+        assert not writer_end.closed # reported without waiting for the end of the stream
+        watchdog.cancel()
+
+def test_replay_reader_keeps_buffer_bounded():
+    stream = io.BytesIO(b"G" + b"0160;" * 100000)
+    reader = HyConRequestReader(stream, chunksize=64)
+    with pytest.raises(ValueError, match="Could not read the arguments of command 'G'"):
+        next(reader)
+    assert stream.tell() < 5 * (HyCon.MAX_RO_GROUP_SIZE + 20)
+    assert list(HyConRequestReader("G" + "0160;" * 499 + "0161.")) == [("set_ro_group", [0x160]*499 + [0x161])]
+
+def test_replay_reads_live_stream():
+    r, w = os.pipe()
+    with os.fdopen(r, "rb") as reader_end, os.fdopen(w, "wb", buffering=0) as writer_end:
+        # ends the stream if the reader would wait for it, instead of hanging forever
+        watchdog = threading.Timer(5, writer_end.close)
+        watchdog.start()
+        reader = HyConRequestReader(reader_end)
+        writer_end.write(b"xiP02000") # the last command is incomplete
+        # commands are returned before the end of the stream
+        assert [next(reader), next(reader)] == ["reset", "ic"]
+        writer_end.write(b"00204X0040000000021084000078")
+        assert next(reader) == ("set_pt", 0x200, 0, 204/1023)
+        writer_end.write(b"1Bo")
+        assert next(reader) == ("set_xbar", 0x40, "0000000210840000781B")
+        assert next(reader) == "op"
+        watchdog.cancel()
+        writer_end.close()
+        assert list(reader) == []
+
+@pytest.mark.parametrize("log, message", [
+    ("xiZ", "Command 'Z' not part of the valid HyCon command characters"),
+    ("xP0200", "Could not read the arguments of command 'P'"),
+    ("X0040000000021084000078XB", "Could not read the arguments of command 'X'"), # too few nibbles
+])
+def test_replay_rejects_broken_logs(log, message):
+    for stream in (log, io.StringIO(log)):
+        with pytest.raises(ValueError, match=message):
+            list(HyConRequestReader(stream))
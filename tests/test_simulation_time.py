@@ -55,6 +55,10 @@ N = t_final / dt
 assert N == int(N)
 N = int(N)  # np.linspace requires an integer
 
+# expected times in the output, only dependent on the numbers above
+time_without_ic = np.arange(t_initial, t_final, dt) + dt
+time_with_ic = np.linspace(t_initial, t_final, N+1, endpoint=True)
+
 def setup_state():
     mt, t = symbols("mt, t")
     integrate, negate = symbols("int, neg")
@@ -69,9 +73,11 @@ def test_setup_state():
     assert "mt" in state.variable_ordering().evolved
     assert  "t" in state.variable_ordering().aux.all
 
+def compile_simulation():
+    compile(setup_state().export(to="C++"))
+
 def run_simulation(write_initial_conditions=False):
-    c_code = setup_state().export(to="C++")
-    compile(c_code)
+    "Runs the binary built by compile_simulation()"
     rawdata = run(arguments={
         'max_iterations': N,
         'modulo_write': 1,
@@ -81,6 +87,7 @@ def run_simulation(write_initial_conditions=False):
     return numpy_read(rawdata, return_recarray=True)
 
 def test_run_simulation():
+    compile_simulation() # once, the runs only differ in runtime arguments
     output_with_ic = run_simulation(True)
     output_without_ic = run_simulation(False)
 
@@ -94,13 +101,11 @@ def test_run_simulation():
     assert np.allclose(output_with_ic["mt"], equalize(output_without_ic["mt"]))
 
     assert len(output_without_ic) == N
-    time_without_ic = np.arange(t_initial, t_final, dt) + dt
     assert len(time_without_ic) == N
     assert np.allclose( time_without_ic, output_without_ic[ "t"])
     assert np.allclose(-time_without_ic, output_without_ic["mt"])
 
     assert len(output_with_ic) == N+1
-    time_with_ic = np.linspace(t_initial, t_final, N+1, endpoint=True)
     assert len(time_with_ic) == N+1
     assert np.allclose( time_with_ic, output_with_ic[ "t"])
     assert np.allclose(-time_with_ic, output_with_ic["mt"])